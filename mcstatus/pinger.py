@@ -16,21 +16,36 @@ class ServerPinger:
         self.port = port
         self.ping_token = ping_token
 
-    def handshake(self):
+    def _handshake_packet(self):
         packet = Connection()
         packet.write_varint(0)
         packet.write_varint(self.version)
         packet.write_utf(self.host)
         packet.write_ushort(self.port)
         packet.write_varint(1)  # Intention to query status
+        return packet
 
-        self.connection.write_buffer(packet)
-
-    def read_status(self):
+    def _status_request_packet(self):
         request = Connection()
         request.write_varint(0)  # Request status
-        self.connection.write_buffer(request)
+        return request
+
+    def handshake(self):
+        self.connection.write_buffer(self._handshake_packet())
 
+    def read_status(self):
+        self.connection.write_buffer(self._status_request_packet())
+        return self._read_status_response()
+
+    def handshake_and_read_status(self):
+        # Both packets go out in a single write, rather than one write each
+        packets = Connection()
+        packets.write_buffer(self._handshake_packet())
+        packets.write_buffer(self._status_request_packet())
+        self.connection.write(packets)
+        return self._read_status_response()
+
+    def _read_status_response(self):
         response = self.connection.read_buffer()
         if response.read_varint() != 0:
             raise IOError("Received invalid status response packet.")
@@ -43,13 +58,28 @@ class ServerPinger:
         except ValueError as e:
             raise IOError("Received invalid status response: %s" % e)
 
-    def test_ping(self):
+    def _ping_packet(self):
         request = Connection()
         request.write_varint(1)  # Test ping
         request.write_long(self.ping_token)
+        return request
+
+    def test_ping(self):
+        request = self._ping_packet()
         sent = datetime.datetime.now()
         self.connection.write_buffer(request)
+        return self._read_ping_response(sent)
+
+    def handshake_and_test_ping(self):
+        # The handshake has no reply, so sending it with the ping leaves the timed round trip as it was
+        packets = Connection()
+        packets.write_buffer(self._handshake_packet())
+        packets.write_buffer(self._ping_packet())
+        sent = datetime.datetime.now()
+        self.connection.write(packets)
+        return self._read_ping_response(sent)
 
+    def _read_ping_response(self, sent):
         response = self.connection.read_buffer()
         received = datetime.datetime.now()
         if response.read_varint() != 1:
@@ -3,119 +3,188 @@ import struct
 
 from ..scripts.address_tools import ip_type
 
+_SHORT = struct.Struct(">h")
+_USHORT = struct.Struct(">H")
+_INT = struct.Struct(">i")
+_UINT = struct.Struct(">I")
+_LONG = struct.Struct(">q")
+_ULONG = struct.Struct(">Q")
+
+# Most that TCPSocketConnection asks the socket for at once when it needs more buffered data
+_RECV_CHUNK_SIZE = 16384
+
+# Encoded size of a varint, indexed by the bit length of its value
+_VARINT_LENGTHS = bytes(max(1, (bits + 6) // 7) for bits in range(36))
+# One fixed-shape encoder per encoded size, so no loop or branch is needed per byte
+_VARINT_ENCODERS = (
+    None,
+    lambda v: bytes((v,)),
+    lambda v: bytes((v & 0x7F | 0x80, v >> 7)),
+    lambda v: bytes((v & 0x7F | 0x80, v >> 7 & 0x7F | 0x80, v >> 14)),
+    lambda v: bytes((v & 0x7F | 0x80, v >> 7 & 0x7F | 0x80, v >> 14 & 0x7F | 0x80, v >> 21)),
+    lambda v: bytes((v & 0x7F | 0x80, v >> 7 & 0x7F | 0x80, v >> 14 & 0x7F | 0x80, v >> 21 & 0x7F | 0x80, v >> 28)),
+)
+
+
+def _peek_varint(buf, pos=0):
+    """
+    Decodes the varint starting at `pos` in `buf` without consuming it.
+
+    Returns a (value, length) tuple. The length is 0 if `buf` ends before the varint does.
+    """
+    start = pos
+    end = min(pos + 5, len(buf))
+    if pos < end and buf[pos] < 0x80:
+        # Packet IDs and most lengths fit in a single byte
+        return buf[pos], 1
+    result = 0
+    shift = 0
+    while pos < end:
+        part = buf[pos]
+        pos += 1
+        result |= (part & 0x7F) << shift
+        if not part & 0x80:
+            return result, pos - start
+        shift += 7
+    if pos - start == 5:
+        raise IOError("Server sent a varint that was too big!")
+    return 0, 0
+
+
 class Connection:
+    __slots__ = ('sent', 'received', '_recv_pos')
+
     def __init__(self):
         self.sent = bytearray()
         self.received = bytearray()
+        self._recv_pos = 0
 
     def read(self, length):
-        result = self.received[:length]
-        self.received = self.received[length:]
+        result = self.received[self._recv_pos:self._recv_pos + length]
+        self._recv_pos += len(result)
         return result
 
     def write(self, data):
         if isinstance(data, Connection):
-            data = bytearray(data.flush())
-        if isinstance(data, str):
-            data = bytearray(data)
-        self.sent.extend(data)
+            data = data.flush()
+        self.sent += data
 
     def receive(self, data):
-        if not isinstance(data, bytearray):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
             data = bytearray(data)
+        if self._recv_pos > 4096:
+            # Only drop consumed bytes once in a while, rather than copying the rest on every read
+            del self.received[:self._recv_pos]
+            self._recv_pos = 0
         self.received.extend(data)
 
     def remaining(self):
-        return len(self.received)
+        return len(self.received) - self._recv_pos
 
     def flush(self):
         result = self.sent
-        self.sent = ""
+        self.sent = bytearray()
         return result
 
-    def _unpack(self, format, data):
-        return struct.unpack(">" + format, bytes(data))[0]
+    def close(self):
+        pass
+
+    def _fill(self):
+        # Everything an in-memory connection will ever read has already been received
+        return False
 
-    def _pack(self, format, data):
-        return struct.pack(">" + format, data)
+    def _read_primitive(self, format):
+        # Decode in place, rather than slicing the bytes out of the buffer first
+        try:
+            value = format.unpack_from(self.received, self._recv_pos)[0]
+        except struct.error:
+            # Only check how much is buffered once the value turns out not to fit
+            while len(self.received) - self._recv_pos < format.size and self._fill():
+                pass
+            value = format.unpack_from(self.received, self._recv_pos)[0]
+        self._recv_pos += format.size
+        return value
 
     def read_varint(self):
-        result = 0
-        for i in range(5):
-            part = ord(self.read(1))
-            result |= (part & 0x7F) << 7 * i
-            if not part & 0x80:
-                return result
-        raise IOError("Server sent a varint that was too big!")
+        value, length = _peek_varint(self.received, self._recv_pos)
+        while not length:
+            if not self._fill():
+                raise IOError("Received a truncated varint")
+            value, length = _peek_varint(self.received, self._recv_pos)
+        self._recv_pos += length
+        return value
 
     def write_varint(self, value):
-        remaining = value
-        for i in range(5):
-            if remaining & ~0x7F == 0:
-                self.write(struct.pack("!B", remaining))
-                return
-            self.write(struct.pack("!B", remaining & 0x7F | 0x80))
-            remaining >>= 7
-        raise ValueError("The value %d is too big to send in a varint" % value)
+        bits = value.bit_length()
+        if value < 0 or bits > 35:
+            raise ValueError("The value %d is too big to send in a varint" % value)
+        self.write(_VARINT_ENCODERS[_VARINT_LENGTHS[bits]](value))
 
     def read_utf(self):
         length = self.read_varint()
         return self.read(length).decode('utf8')
 
     def write_utf(self, value):
+        if isinstance(value, str):
+            value = value.encode('utf8')
         self.write_varint(len(value))
-        self.write(bytearray(value, 'utf8'))
+        self.write(value)
 
     def read_ascii(self):
-        result = bytearray()
-        while len(result) == 0 or result[-1] != 0:
-            result.extend(self.read(1))
-        return result[:-1].decode("ISO-8859-1")
+        end = self.received.find(0, self._recv_pos)
+        while end == -1:
+            searched = len(self.received) - self._recv_pos
+            if not self._fill():
+                raise IOError("Received an unterminated string")
+            end = self.received.find(0, self._recv_pos + searched)
+        result = self.received[self._recv_pos:end]
+        self._recv_pos = end + 1
+        return result.decode("ISO-8859-1")
 
     def write_ascii(self, value):
-        self.write(bytearray(value, 'ISO-8859-1'))
-        self.write(bytearray.fromhex("00"))
+        self.write(value.encode('ISO-8859-1') + b"\x00")
 
     def read_short(self):
-        return self._unpack("h", self.read(2))
+        return self._read_primitive(_SHORT)
 
     def write_short(self, value):
-        self.write(self._pack("h", value))
+        self.write(_SHORT.pack(value))
 
     def read_ushort(self):
-        return self._unpack("H", self.read(2))
+        return self._read_primitive(_USHORT)
 
     def write_ushort(self, value):
-        self.write(self._pack("H", value))
+        self.write(_USHORT.pack(value))
 
     def read_int(self):
-        return self._unpack("i", self.read(4))
+        return self._read_primitive(_INT)
 
     def write_int(self, value):
-        self.write(self._pack("i", value))
+        self.write(_INT.pack(value))
 
     def read_uint(self):
-        return self._unpack("I", self.read(4))
+        return self._read_primitive(_UINT)
 
     def write_uint(self, value):
-        self.write(self._pack("I", value))
+        self.write(_UINT.pack(value))
 
     def read_long(self):
-        return self._unpack("q", self.read(8))
+        return self._read_primitive(_LONG)
 
     def write_long(self, value):
-        self.write(self._pack("q", value))
+        self.write(_LONG.pack(value))
 
     def read_ulong(self):
-        return self._unpack("Q", self.read(8))
+        return self._read_primitive(_ULONG)
 
     def write_ulong(self, value):
-        self.write(self._pack("Q", value))
+        self.write(_ULONG.pack(value))
 
     def read_buffer(self):
         length = self.read_varint()
         result = Connection()
-        result.receive(self.read(length))
+        # read() already returns a fresh bytearray, so hand it over instead of copying it again
+        result.received = self.read(length)
         return result
 
     def write_buffer(self, buffer):
@@ -125,10 +194,13 @@ class Connection:
 
 
 class TCPSocketConnection(Connection):
+    __slots__ = ('socket', '_chunk')
+
     def __init__(self, addr, timeout=3):
         Connection.__init__(self)
         self.socket = socket.create_connection(addr, timeout=timeout)
         self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._chunk = bytearray(_RECV_CHUNK_SIZE)
 
     def flush(self):
         raise TypeError("TCPSocketConnection does not support flush()")
@@ -139,17 +211,48 @@ class TCPSocketConnection(Connection):
     def remaining(self):
         raise TypeError("TCPSocketConnection does not support remaining()")
 
+    def _fill(self):
+        count = self.socket.recv_into(self._chunk)
+        if count == 0:
+            raise IOError("Server did not respond with any information!")
+        Connection.receive(self, memoryview(self._chunk)[:count])
+        return True
+
     def read(self, length):
-        result = bytearray()
-        while len(result) < length:
-            new = self.socket.recv(length - len(result))
-            if len(new) == 0:
-                raise IOError("Server did not respond with any information!")
-            result.extend(new)
+        buffered = len(self.received) - self._recv_pos
+        if length <= buffered:
+            return Connection.read(self, length)
+        # Take whatever was read ahead, then receive the rest straight into the result
+        result = bytearray(length)
+        result[:buffered] = memoryview(self.received)[self._recv_pos:]
+        self._recv_pos += buffered
+        received = buffered
+        with memoryview(result) as view:
+            while received < length:
+                count = self.socket.recv_into(view[received:])
+                if count == 0:
+                    raise IOError("Server did not respond with any information!")
+                received += count
         return result
 
     def write(self, data):
-        self.socket.send(data)
+        if isinstance(data, Connection):
+            data = data.flush()
+        self.socket.sendall(data)
+
+    def write_buffer(self, buffer):
+        # Frame the packet in memory first, so that it goes out in one send rather than two
+        packet = Connection()
+        packet.write_buffer(buffer)
+        self.write(packet)
+
+    def close(self):
+        # Shutting down first also wakes up a recv() blocked on this socket in another thread
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
 
     def __del__(self):
         try:
@@ -159,11 +262,15 @@ class TCPSocketConnection(Connection):
 
 
 class UDPSocketConnection(Connection):
+    __slots__ = ('addr', 'socket')
+
     def __init__(self, addr, timeout=3):
         Connection.__init__(self)
         self.addr = addr
         self.socket = socket.socket(socket.AF_INET if ip_type(addr[0]) == 4 else socket.AF_INET6, socket.SOCK_DGRAM)
         self.socket.settimeout(timeout)
+        # Resolves addr only once, and has the kernel drop datagrams from anyone else
+        self.socket.connect(addr)
 
     def flush(self):
         raise TypeError("UDPSocketConnection does not support flush()")
@@ -175,15 +282,15 @@ class UDPSocketConnection(Connection):
         return 65535
 
     def read(self, length):
-        result = bytearray()
+        result = b""
         while len(result) == 0:
-            result.extend(self.socket.recvfrom(self.remaining())[0])
+            result = self.socket.recv(self.remaining())
         return result
 
     def write(self, data):
         if isinstance(data, Connection):
-            data = bytearray(data.flush())
-        self.socket.sendto(data, self.addr)
+            data = data.flush()
+        self.socket.send(data)
 
     def __del__(self):
         try:
@@ -2,7 +2,119 @@ from mcstatus.pinger import ServerPinger
 from mcstatus.protocol.connection import TCPSocketConnection, UDPSocketConnection
 from mcstatus.querier import ServerQuerier
 from mcstatus.scripts.address_tools import parse_address
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import dns.resolver
+import threading
+import time
+
+# Names or records that do not exist are remembered for this many seconds; answers are kept for their own TTL
+_NEGATIVE_TTL = 30
+_DNS_CACHE_SIZE = 1024
+# Seconds to give an attempt at ping() or status() before starting the next one alongside it,
+# stretched to this many times the slowest connect seen, since an exchange takes a few round trips
+_RETRY_STAGGER = 1.0
+_RETRY_STAGGER_CONNECTS = 5
+# Most attempts that may run alongside an earlier, still pending attempt, across all calls at once
+_MAX_OVERLAPPING_ATTEMPTS = 64
+
+_overlap_slots = threading.BoundedSemaphore(_MAX_OVERLAPPING_ATTEMPTS)
+
+_dns_cache = {}
+# ping_many() resolves from many threads at once; the lookup itself happens outside the lock
+_dns_cache_lock = threading.Lock()
+
+
+def _resolve(name, rdtype):
+    key = (name, rdtype)
+    now = time.monotonic()
+    with _dns_cache_lock:
+        cached = _dns_cache.get(key)
+    if cached is not None and cached[0] > now:
+        if isinstance(cached[1], type):
+            # A fresh exception each time, so tracebacks don't pile up on a shared instance
+            raise cached[1]()
+        return cached[1]
+
+    try:
+        answers = dns.resolver.query(name, rdtype)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as e:
+        _cache_dns(key, now, now + _NEGATIVE_TTL, type(e))
+        raise
+    _cache_dns(key, now, now + answers.rrset.ttl, answers)
+    return answers
+
+
+def _cache_dns(key, now, expires, result):
+    with _dns_cache_lock:
+        if len(_dns_cache) >= _DNS_CACHE_SIZE:
+            for stale in [k for k, v in _dns_cache.items() if v[0] <= now]:
+                del _dns_cache[stale]
+            if len(_dns_cache) >= _DNS_CACHE_SIZE:
+                _dns_cache.clear()
+        _dns_cache[key] = (expires, result)
+
+
+def _first_success(attempt, tries):
+    # Rather than waiting out a hung attempt, start another one alongside it once it is overdue.
+    # Each attempt opens its own connection, so overdue servers see extra connections; the
+    # delay adapts to the connect time and _MAX_OVERLAPPING_ATTEMPTS bounds the total.
+    lock = threading.Lock()
+    connections = []
+    connect_times = []
+    finished = False
+
+    def track(connect):
+        begin = time.monotonic()
+        connection = connect()
+        with lock:
+            if not finished:
+                connections.append(connection)
+                connect_times.append(time.monotonic() - begin)
+                return connection
+        connection.close()
+        raise IOError("Another attempt has already finished")
+
+    def overdue_at(launched):
+        with lock:
+            slowest = max(connect_times, default=0)
+        return launched + max(_RETRY_STAGGER, slowest * _RETRY_STAGGER_CONNECTS)
+
+    executor = ThreadPoolExecutor(max_workers=max(tries, 1))
+    pending = set()
+    exception = None
+    started = 0
+    launched = 0
+    try:
+        while started < tries or pending:
+            timeout = None
+            if started < tries:
+                if not pending:
+                    pending.add(executor.submit(attempt, track))
+                    started += 1
+                    launched = time.monotonic()
+                elif time.monotonic() >= overdue_at(launched) and _overlap_slots.acquire(False):
+                    future = executor.submit(attempt, track)
+                    future.add_done_callback(lambda f: _overlap_slots.release())
+                    pending.add(future)
+                    started += 1
+                    launched = time.monotonic()
+            if started < tries:
+                # Once overdue with no slot free, check back periodically for one
+                timeout = max(overdue_at(launched) - time.monotonic(), 0) or _RETRY_STAGGER
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    exception = e
+        raise exception
+    finally:
+        with lock:
+            finished = True
+        # Closing the losers' sockets aborts whatever they are blocked on, so their threads end
+        for connection in connections:
+            connection.close()
+        executor.shutdown(wait=False)
 
 
 class MinecraftServer:
@@ -16,7 +128,7 @@ class MinecraftServer:
         if port is None:
             port = 25565
             try:
-                answers = dns.resolver.query("_minecraft._tcp." + host, "SRV")
+                answers = _resolve("_minecraft._tcp." + host, "SRV")
                 if len(answers):
                     answer = answers[0]
                     host = str(answer.target).rstrip(".")
@@ -26,39 +138,43 @@ class MinecraftServer:
 
         return MinecraftServer(host, port)
 
-    def ping(self, tries=3, **kwargs):
-        connection = TCPSocketConnection((self.host, self.port))
-        exception = None
-        for attempt in range(tries):
+    @classmethod
+    def ping_many(cls, addresses, concurrency=256, **kwargs):
+        def ping(address):
             try:
-                pinger = ServerPinger(connection, host=self.host, port=self.port, **kwargs)
-                pinger.handshake()
-                return pinger.test_ping()
+                return cls.lookup(address).ping(**kwargs)
             except Exception as e:
-                exception = e
-        else:
-            raise exception
+                return e
+
+        # Pings spend nearly all their time waiting on the network, so overlap as many as allowed
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(ping, addresses))
+
+    def _connect(self, track, **kwargs):
+        connection = track(lambda: TCPSocketConnection((self.host, self.port)))
+        return ServerPinger(connection, host=self.host, port=self.port, **kwargs)
+
+    def ping(self, tries=3, **kwargs):
+        def attempt(track):
+            pinger = self._connect(track, **kwargs)
+            return pinger.handshake_and_test_ping()
+
+        return _first_success(attempt, tries)
 
     def status(self, tries=3, **kwargs):
-        connection = TCPSocketConnection((self.host, self.port))
-        exception = None
-        for attempt in range(tries):
-            try:
-                pinger = ServerPinger(connection, host=self.host, port=self.port, **kwargs)
-                pinger.handshake()
-                result = pinger.read_status()
-                result.latency = pinger.test_ping()
-                return result
-            except Exception as e:
-                exception = e
-        else:
-            raise exception
+        def attempt(track):
+            pinger = self._connect(track, **kwargs)
+            result = pinger.handshake_and_read_status()
+            result.latency = pinger.test_ping()
+            return result
+
+        return _first_success(attempt, tries)
 
     def query(self, tries=3):
         exception = None
         host = self.host
         try:
-            answers = dns.resolver.query(host, "A")
+            answers = _resolve(host, "A")
             if len(answers):
                 answer = answers[0]
                 host = str(answer).rstrip(".")
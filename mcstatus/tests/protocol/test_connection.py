@@ -1,3 +1,4 @@
+import socket
 from unittest import TestCase
 
 from mock import Mock, patch
@@ -13,7 +14,14 @@ class TestConnection(TestCase):
         self.connection.sent = bytearray.fromhex("7FAABB")
 
         self.assertEqual(self.connection.flush(), bytearray.fromhex("7FAABB"))
-        self.assertTrue(self.connection.sent == "")
+        self.assertEqual(self.connection.sent, bytearray())
+
+    def test_writeAfterFlush(self):
+        self.connection.write(bytearray.fromhex("7F"))
+        self.connection.flush()
+        self.connection.write(bytearray.fromhex("AABB"))
+
+        self.assertEqual(self.connection.flush(), bytearray.fromhex("AABB"))
 
     def test_receive(self):
         self.connection.receive(bytearray.fromhex("7F"))
@@ -39,6 +47,14 @@ class TestConnection(TestCase):
         self.assertEqual(self.connection.read(2), bytearray.fromhex("7FAA"))
         self.assertEqual(self.connection.read(1), bytearray.fromhex("BB"))
 
+    def test_receiveAfterManyReads(self):
+        self.connection.receive(bytearray(5000) + bytearray.fromhex("7F"))
+        self.connection.read(5000)
+        self.connection.receive(bytearray.fromhex("AABB"))
+
+        self.assertEqual(self.connection.remaining(), 3)
+        self.assertEqual(self.connection.read(3), bytearray.fromhex("7FAABB"))
+
     def test_readSimpleVarInt(self):
         self.connection.receive(bytearray.fromhex("0F"))
 
@@ -64,9 +80,23 @@ class TestConnection(TestCase):
 
         self.assertRaises(IOError, self.connection.read_varint)
 
+    def test_readTruncatedVarInt(self):
+        self.connection.receive(bytearray.fromhex("FFFF"))
+
+        self.assertRaises(IOError, self.connection.read_varint)
+
+    def test_readVarIntLeavesRemainder(self):
+        self.connection.receive(bytearray.fromhex("AC027F"))
+
+        self.assertEqual(self.connection.read_varint(), 300)
+        self.assertEqual(self.connection.read(1), bytearray.fromhex("7F"))
+
     def test_writeInvalidVarInt(self):
         self.assertRaises(ValueError, self.connection.write_varint, 34359738368)
 
+    def test_writeNegativeVarInt(self):
+        self.assertRaises(ValueError, self.connection.write_varint, -1)
+
     def test_readUtf(self):
         self.connection.receive(bytearray.fromhex("0D48656C6C6F2C20776F726C6421"))
 
@@ -77,6 +107,16 @@ class TestConnection(TestCase):
 
         self.assertEqual(self.connection.flush(), bytearray.fromhex("0D48656C6C6F2C20776F726C6421"))
 
+    def test_writeNonAsciiUtf(self):
+        self.connection.write_utf("\u00e9")
+
+        self.assertEqual(self.connection.flush(), bytearray.fromhex("02C3A9"))
+
+    def test_writeUtfBytes(self):
+        self.connection.write_utf(b"Hello, world!")
+
+        self.assertEqual(self.connection.flush(), bytearray.fromhex("0D48656C6C6F2C20776F726C6421"))
+
     def test_readEmptyUtf(self):
         self.connection.write_utf("")
 
@@ -87,6 +127,11 @@ class TestConnection(TestCase):
 
         self.assertEqual(self.connection.read_ascii(), "Hello, world!")
 
+    def test_readUnterminatedAscii(self):
+        self.connection.receive(bytearray.fromhex("48656C6C6F"))
+
+        self.assertRaises(IOError, self.connection.read_ascii)
+
     def test_writeAscii(self):
         self.connection.write_ascii("Hello, world!")
 
@@ -194,6 +239,14 @@ class TestConnection(TestCase):
         self.assertEqual(buffer.received, bytearray.fromhex("7FAA"))
         self.assertEqual(self.connection.flush(), bytearray())
 
+    def test_writeConnection(self):
+        other = Connection()
+        other.write(bytearray.fromhex("7FAA"))
+        self.connection.write(other)
+
+        self.assertEqual(self.connection.flush(), bytearray.fromhex("7FAA"))
+        self.assertEqual(other.flush(), bytearray())
+
     def test_writeBuffer(self):
         buffer = Connection()
         buffer.write(bytearray.fromhex("7FAA"))
@@ -202,11 +255,21 @@ class TestConnection(TestCase):
         self.assertEqual(self.connection.flush(), bytearray.fromhex("027FAA"))
 
 
+def fake_recv_into(*chunks):
+    chunks = list(chunks)
+
+    def recv_into(buffer):
+        chunk = chunks.pop(0)[:len(buffer)]
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+    return recv_into
+
+
 class TCPSocketConnectionTest(TestCase):
     def setUp(self):
         socket = Mock()
-        socket.recv = Mock()
-        socket.send = Mock()
+        socket.recv_into = Mock()
+        socket.sendall = Mock()
         with patch("socket.create_connection") as create_connection:
             create_connection.return_value = socket
             self.connection = TCPSocketConnection(("localhost", 1234))
@@ -221,27 +284,85 @@ class TCPSocketConnectionTest(TestCase):
         self.assertRaises(TypeError, self.connection.remaining)
 
     def test_read(self):
-        self.connection.socket.recv.return_value = bytearray.fromhex("7FAA")
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("7FAA"))
+
+        self.assertEqual(self.connection.read(2), bytearray.fromhex("7FAA"))
+
+    def test_read_partial(self):
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("7F"), bytearray.fromhex("AA"))
 
         self.assertEqual(self.connection.read(2), bytearray.fromhex("7FAA"))
 
     def test_read_empty(self):
-        self.connection.socket.recv.return_value = bytearray.fromhex("")
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex(""))
 
         with self.assertRaises(IOError):
             self.connection.read(2)
 
+    def test_read_varint(self):
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("AC"), bytearray.fromhex("02"))
+
+        self.assertEqual(self.connection.read_varint(), 300)
+
+    def test_read_after_varint(self):
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("027FAA"))
+
+        self.assertEqual(self.connection.read_varint(), 2)
+        self.assertEqual(self.connection.read(2), bytearray.fromhex("7FAA"))
+        self.assertEqual(self.connection.socket.recv_into.call_count, 1)
+
+    def test_read_past_buffered(self):
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("037F"), bytearray.fromhex("AABB"))
+
+        self.assertEqual(self.connection.read_varint(), 3)
+        self.assertEqual(self.connection.read(3), bytearray.fromhex("7FAABB"))
+
+    def test_read_long(self):
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("000000"), bytearray.fromhex("0000DD7D1C"))
+
+        self.assertEqual(self.connection.read_long(), 14515484)
+
+    def test_read_buffer(self):
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("037F"), bytearray.fromhex("AABB"))
+        buffer = self.connection.read_buffer()
+
+        self.assertEqual(buffer.read(3), bytearray.fromhex("7FAABB"))
+        self.assertEqual(buffer.remaining(), 0)
+
+    def test_read_ascii(self):
+        self.connection.socket.recv_into.side_effect = fake_recv_into(bytearray.fromhex("48656C"), bytearray.fromhex("6C6F00"))
+
+        self.assertEqual(self.connection.read_ascii(), "Hello")
+
     def test_write(self):
         self.connection.write(bytearray.fromhex("7FAA"))
 
-        self.connection.socket.send.assert_called_once_with(bytearray.fromhex("7FAA"))
+        self.connection.socket.sendall.assert_called_once_with(bytearray.fromhex("7FAA"))
+
+    def test_write_varint(self):
+        self.connection.write_varint(300)
+
+        self.connection.socket.sendall.assert_called_once_with(bytearray.fromhex("AC02"))
+
+    def test_close(self):
+        self.connection.close()
+
+        self.connection.socket.shutdown.assert_called_once_with(socket.SHUT_RDWR)
+        self.connection.socket.close.assert_called_once_with()
+
+    def test_write_buffer(self):
+        buffer = Connection()
+        buffer.write(bytearray.fromhex("7FAA"))
+        self.connection.write_buffer(buffer)
+
+        self.connection.socket.sendall.assert_called_once_with(bytearray.fromhex("027FAA"))
 
 
 class UDPSocketConnectionTest(TestCase):
     def setUp(self):
         socket = Mock()
-        socket.recvfrom = Mock()
-        socket.sendto = Mock()
+        socket.recv = Mock()
+        socket.send = Mock()
         with patch("socket.socket") as create_socket:
             create_socket.return_value = socket
             self.connection = UDPSocketConnection(("localhost", 1234))
@@ -255,12 +376,20 @@ class UDPSocketConnectionTest(TestCase):
     def test_remaining(self):
         self.assertEqual(self.connection.remaining(), 65535)
 
+    def test_connect(self):
+        self.connection.socket.connect.assert_called_once_with(("localhost", 1234))
+
     def test_read(self):
-        self.connection.socket.recvfrom.return_value = [bytearray.fromhex("7FAA")]
+        self.connection.socket.recv.return_value = bytearray.fromhex("7FAA")
+
+        self.assertEqual(self.connection.read(2), bytearray.fromhex("7FAA"))
+
+    def test_read_skips_empty(self):
+        self.connection.socket.recv.side_effect = [bytearray(), bytearray.fromhex("7FAA")]
 
         self.assertEqual(self.connection.read(2), bytearray.fromhex("7FAA"))
 
     def test_write(self):
         self.connection.write(bytearray.fromhex("7FAA"))
 
-        self.connection.socket.sendto.assert_called_once_with(bytearray.fromhex("7FAA"), ("localhost", 1234))
\ No newline at end of file
+        self.connection.socket.send.assert_called_once_with(bytearray.fromhex("7FAA"))
\ No newline at end of file
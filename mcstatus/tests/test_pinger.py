@@ -21,6 +21,13 @@ class TestServerPinger(TestCase):
         self.assertEqual(status.raw, {"description":"A Minecraft Server","players":{"max":20,"online":0},"version":{"name":"1.8-pre1","protocol":44}})
         self.assertEqual(self.pinger.connection.flush(), bytearray.fromhex("0100"))
 
+    def test_handshake_and_read_status(self):
+        self.pinger.connection.receive(bytearray.fromhex("7200707B226465736372697074696F6E223A2241204D696E65637261667420536572766572222C22706C6179657273223A7B226D6178223A32302C226F6E6C696E65223A307D2C2276657273696F6E223A7B226E616D65223A22312E382D70726531222C2270726F746F636F6C223A34347D7D"))
+        status = self.pinger.handshake_and_read_status()
+
+        self.assertEqual(status.raw, {"description":"A Minecraft Server","players":{"max":20,"online":0},"version":{"name":"1.8-pre1","protocol":44}})
+        self.assertEqual(self.pinger.connection.flush(), bytearray.fromhex("0F002C096C6F63616C686F737463DD010100"))
+
     def test_read_status_invalid_json(self):
         self.pinger.connection.receive(bytearray.fromhex("0300017B"))
         self.assertRaises(IOError, self.pinger.read_status)
@@ -42,6 +49,13 @@ class TestServerPinger(TestCase):
         self.assertTrue(self.pinger.test_ping() >= 0)
         self.assertEqual(self.pinger.connection.flush(), bytearray.fromhex("09010000000000DD7D1C"))
 
+    def test_handshake_and_test_ping(self):
+        self.pinger.connection.receive(bytearray.fromhex("09010000000000DD7D1C"))
+        self.pinger.ping_token = 14515484
+
+        self.assertTrue(self.pinger.handshake_and_test_ping() >= 0)
+        self.assertEqual(self.pinger.connection.flush(), bytearray.fromhex("0F002C096C6F63616C686F737463DD0109010000000000DD7D1C"))
+
     def test_test_ping_invalid(self):
         self.pinger.connection.receive(bytearray.fromhex("011F"))
         self.pinger.ping_token = 14515484
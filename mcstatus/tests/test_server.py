@@ -1,13 +1,25 @@
+import sys
+import threading
 from unittest import TestCase
 
-from mock import patch, Mock
+import dns.resolver
+from mock import patch, Mock, MagicMock
 
 from mcstatus.protocol.connection import Connection
-from mcstatus.server import MinecraftServer
+from mcstatus.server import MinecraftServer, _dns_cache, _resolve
+
+
+def dns_answers(*records, ttl=300):
+    answers = MagicMock()
+    answers.__len__.return_value = len(records)
+    answers.__getitem__.side_effect = records.__getitem__
+    answers.rrset.ttl = ttl
+    return answers
 
 
 class TestMinecraftServer(TestCase):
     def setUp(self):
+        _dns_cache.clear()
         self.socket = Connection()
         self.server = MinecraftServer("localhost", port=25565)
 
@@ -24,12 +36,94 @@ class TestMinecraftServer(TestCase):
 
     def test_ping_retry(self):
         with patch("mcstatus.server.TCPSocketConnection") as connection:
-            connection.return_value = None
+            connection.return_value = Mock()
             with patch("mcstatus.server.ServerPinger") as pinger:
                 pinger.side_effect = [Exception, Exception, Exception]
                 self.assertRaises(Exception, self.server.ping)
                 self.assertEqual(pinger.call_count, 3)
 
+    def test_ping_hung_attempt(self):
+        release = threading.Event()
+        slow_connection, fast_connection = Mock(), Mock()
+        slow_connection.close.side_effect = release.set
+        slow = Mock()
+        slow.handshake_and_test_ping.side_effect = lambda: release.wait(5)
+        fast = Mock()
+        fast.handshake_and_test_ping.return_value = 42
+
+        with patch("mcstatus.server.TCPSocketConnection") as connection, patch("mcstatus.server._RETRY_STAGGER", 0.01):
+            connection.side_effect = [slow_connection, fast_connection]
+            with patch("mcstatus.server.ServerPinger") as pinger:
+                pinger.side_effect = [slow, fast]
+                try:
+                    self.assertEqual(self.server.ping(), 42)
+                finally:
+                    release.set()
+
+        slow_connection.close.assert_called_once_with()
+        fast_connection.close.assert_called_once_with()
+
+    def test_ping_slow_attempt_not_overlapped(self):
+        slow = Mock()
+        slow.handshake_and_test_ping.side_effect = lambda: threading.Event().wait(0.05) or 42
+
+        with patch("mcstatus.server.TCPSocketConnection"), patch("mcstatus.server._RETRY_STAGGER", 1):
+            with patch("mcstatus.server.ServerPinger") as pinger:
+                pinger.return_value = slow
+                self.assertEqual(self.server.ping(), 42)
+                self.assertEqual(pinger.call_count, 1)
+
+    def test_ping_overlap_capped(self):
+        slow = Mock()
+        slow.handshake_and_test_ping.side_effect = lambda: threading.Event().wait(0.1) or 42
+
+        with patch("mcstatus.server.TCPSocketConnection"), patch("mcstatus.server._RETRY_STAGGER", 0.01), \
+                patch("mcstatus.server._overlap_slots", threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            with patch("mcstatus.server.ServerPinger") as pinger:
+                pinger.return_value = slow
+                self.assertEqual(self.server.ping(), 42)
+                self.assertEqual(pinger.call_count, 1)
+
+    def test_ping_many(self):
+        error = IOError("Server did not respond with any information!")
+
+        def ping(server, **kwargs):
+            if server.host == "down.example.org":
+                raise error
+            return server.port
+
+        with patch.object(MinecraftServer, "ping", autospec=True) as server_ping:
+            server_ping.side_effect = ping
+            results = MinecraftServer.ping_many(["up.example.org:1", "down.example.org:2", "up.example.org:3"])
+
+        self.assertEqual(results, [1, error, 3])
+
+    def test_ping_many_srv(self):
+        def query(name, rdtype):
+            answer = Mock()
+            answer.target = "mc." + name.split(".", 2)[2] + "."
+            answer.port = 20000 + int(name.split(".")[2][len("host"):])
+            # Already expired, so that every insert into the small cache has stale entries to evict
+            return dns_answers(answer, ttl=-1)
+
+        def ping(server, **kwargs):
+            return (server.host, server.port)
+
+        addresses = ["host%d.example.org" % (i % 100) for i in range(1000)]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with patch("dns.resolver.query") as resolver_query, patch("mcstatus.server._DNS_CACHE_SIZE", 8), \
+                    patch.object(MinecraftServer, "ping", autospec=True) as server_ping:
+                resolver_query.side_effect = query
+                server_ping.side_effect = ping
+                results = MinecraftServer.ping_many(addresses, concurrency=32)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(results, [("mc.host%d.example.org" % (i % 100), 20000 + i % 100) for i in range(1000)])
+
     def test_status(self):
         self.socket.receive(bytearray.fromhex("6D006B7B226465736372697074696F6E223A2241204D696E65637261667420536572766572222C22706C6179657273223A7B226D6178223A32302C226F6E6C696E65223A307D2C2276657273696F6E223A7B226E616D65223A22312E38222C2270726F746F636F6C223A34377D7D09010000000001C54246"))
 
@@ -44,7 +138,7 @@ class TestMinecraftServer(TestCase):
 
     def test_status_retry(self):
         with patch("mcstatus.server.TCPSocketConnection") as connection:
-            connection.return_value = None
+            connection.return_value = Mock()
             with patch("mcstatus.server.ServerPinger") as pinger:
                 pinger.side_effect = [Exception, Exception, Exception]
                 self.assertRaises(Exception, self.server.status)
@@ -54,10 +148,8 @@ class TestMinecraftServer(TestCase):
         self.socket.receive(bytearray.fromhex("090000000035373033353037373800"))
         self.socket.receive(bytearray.fromhex("00000000000000000000000000000000686f73746e616d650041204d696e656372616674205365727665720067616d657479706500534d500067616d655f6964004d494e4543524146540076657273696f6e00312e3800706c7567696e7300006d617000776f726c64006e756d706c61796572730033006d6178706c617965727300323000686f7374706f727400323535363500686f73746970003139322e3136382e35362e31000001706c617965725f000044696e6e6572626f6e6500446a696e6e69626f6e650053746576650000"))
 
-        self.socket.remaining = Mock()
-        self.socket.remaining.side_effect = [15, 208]
-
-        with patch("mcstatus.server.UDPSocketConnection") as connection:
+        with patch("mcstatus.server.UDPSocketConnection") as connection, \
+                patch.object(Connection, "remaining", side_effect=[15, 208]):
             connection.return_value = self.socket
             info = self.server.query()
 
@@ -85,7 +177,7 @@ class TestMinecraftServer(TestCase):
 
     def test_by_address_no_srv(self):
         with patch("dns.resolver.query") as query:
-            query.return_value = []
+            query.side_effect = dns.resolver.NoAnswer
             self.server = MinecraftServer.lookup("example.org")
             query.assert_called_once_with("_minecraft._tcp.example.org", "SRV")
         self.assertEqual(self.server.host, "example.org")
@@ -104,12 +196,63 @@ class TestMinecraftServer(TestCase):
             answer = Mock()
             answer.target = "different.example.org."
             answer.port = 12345
-            query.return_value = [answer]
+            query.return_value = dns_answers(answer)
             self.server = MinecraftServer.lookup("example.org")
             query.assert_called_once_with("_minecraft._tcp.example.org", "SRV")
         self.assertEqual(self.server.host, "different.example.org")
         self.assertEqual(self.server.port, 12345)
 
+    def test_by_address_srv_cached(self):
+        with patch("dns.resolver.query") as query:
+            answer = Mock()
+            answer.target = "different.example.org."
+            answer.port = 12345
+            query.return_value = dns_answers(answer, ttl=60)
+            MinecraftServer.lookup("example.org")
+            self.server = MinecraftServer.lookup("example.org")
+            query.assert_called_once_with("_minecraft._tcp.example.org", "SRV")
+        self.assertEqual(self.server.host, "different.example.org")
+        self.assertEqual(self.server.port, 12345)
+
+    def test_by_address_srv_expired(self):
+        with patch("dns.resolver.query") as query, patch("time.monotonic") as monotonic:
+            query.return_value = dns_answers(ttl=60)
+            monotonic.return_value = 1000
+            MinecraftServer.lookup("example.org")
+            monotonic.return_value = 1061
+            MinecraftServer.lookup("example.org")
+            self.assertEqual(query.call_count, 2)
+
+    def test_by_address_no_srv_cached(self):
+        with patch("dns.resolver.query") as query:
+            query.side_effect = dns.resolver.NoAnswer
+            MinecraftServer.lookup("example.org")
+            self.server = MinecraftServer.lookup("example.org")
+            query.assert_called_once_with("_minecraft._tcp.example.org", "SRV")
+        self.assertEqual(self.server.host, "example.org")
+        self.assertEqual(self.server.port, 25565)
+
+    def test_resolve_nxdomain_raises_fresh_exception(self):
+        with patch("dns.resolver.query") as query:
+            query.side_effect = dns.resolver.NXDOMAIN
+            with self.assertRaises(dns.resolver.NXDOMAIN):
+                _resolve("example.org", "A")
+            with self.assertRaises(dns.resolver.NXDOMAIN) as first:
+                _resolve("example.org", "A")
+            with self.assertRaises(dns.resolver.NXDOMAIN) as second:
+                _resolve("example.org", "A")
+            query.assert_called_once_with("example.org", "A")
+        self.assertIsNot(first.exception, second.exception)
+
+    def test_by_address_nxdomain_cached(self):
+        with patch("dns.resolver.query") as query:
+            query.side_effect = dns.resolver.NXDOMAIN
+            MinecraftServer.lookup("example.org")
+            self.server = MinecraftServer.lookup("example.org")
+            query.assert_called_once_with("_minecraft._tcp.example.org", "SRV")
+        self.assertEqual(self.server.host, "example.org")
+        self.assertEqual(self.server.port, 25565)
+
     def test_by_address_with_port(self):
         self.server = MinecraftServer.lookup("example.org:12345")
         self.assertEqual(self.server.host, "example.org")